@@ -1,9 +1,9 @@
-import json
 import logging
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
 
+import orjson
 import pandas as pd
 from rich.console import Console
 from rich.progress import (
@@ -124,7 +124,75 @@ def load_json(file: Path) -> dict:
     Returns:
         dict: The contents of the json file.
     """
-    with open(file) as f:
-        data = json.load(f)
+    with open(file, "rb") as f:
+        data = orjson.loads(f.read())
 
     return data
+
+
+def save_json(data: dict, file: Path) -> None:
+    """
+    Saves a dictionary to a json file.
+
+    Args:
+        data (dict): The data to save.
+        file (str): The path to the json file.
+
+    Returns:
+        None
+    """
+    Path(file).write_bytes(
+        orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS)
+    )
+
+
+def feistel(value: int, key: int, half_bits: int, rounds: int = 4) -> int:
+    """
+    Permutes an integer of `2 * half_bits` bits using a keyed Feistel network.
+
+    The network is a bijection, so distinct values always map to distinct values.
+
+    Args:
+        value (int): The integer to permute, in [0, 2 ** (2 * half_bits)).
+        key (int): The key selecting the permutation.
+        half_bits (int): The number of bits in each half of the integer.
+        rounds (int): The number of Feistel rounds.
+
+    Returns:
+        int: The permuted integer.
+    """
+    mask = (1 << half_bits) - 1
+    left, right = value >> half_bits, value & mask
+
+    for round_idx in range(rounds):
+        # round function: mix the right half with a per-round key (32-bit hash)
+        round_value = (right + key * (round_idx + 1)) & 0xFFFFFFFF
+        round_value = (round_value * 0x9E3779B1) & 0xFFFFFFFF
+        round_value ^= round_value >> 16
+        round_value = (round_value * 0x85EBCA6B) & 0xFFFFFFFF
+        round_value ^= round_value >> 13
+        left, right = right, left ^ (round_value & mask)
+
+    return (left << half_bits) | right
+
+
+def permuted_range(size: int, key: int) -> Iterator[int]:
+    """
+    Yields every integer in [0, size) exactly once, in a keyed pseudo-random order.
+
+    Uses `feistel` with cycle walking to stay within the range.
+
+    Args:
+        size (int): The number of integers to yield.
+        key (int): The key selecting the order.
+
+    Yields:
+        int: The next integer in the permutation.
+    """
+    half_bits = max(1, ((size - 1).bit_length() + 1) // 2)
+
+    for counter in range(size):
+        value = feistel(counter, key, half_bits)
+        while value >= size:
+            value = feistel(value, key, half_bits)
+        yield value
@@ -18,9 +18,8 @@ except ValueError:
     pass
 
 import logging
-from typing import Dict, Set
+from typing import Dict, Iterator, Set
 import random
-import json
 
 from rich.logging import RichHandler
 import pandas as pd
@@ -41,25 +40,52 @@ logargs = {
 logging.basicConfig(**logargs)
 
 
-def generate_site_id() -> str:
+def get_site_ids(key: int) -> Iterator[str]:
     """
-    Generate a new site ID as a random 2-letter string.
+    Generate every possible 2-letter site ID exactly once, in a keyed random order.
+
+    Args:
+        key (int): The key selecting the order of the site IDs.
+
+    Yields:
+        str: The next site ID.
+    """
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+    for idx in utils.permuted_range(len(letters) ** 2, key):
+        yield letters[idx // len(letters)] + letters[idx % len(letters)]
+
+
+def generate_site_id(site_ids: Iterator[str]) -> str:
+    """
+    Generate a new site ID, unique among the IDs drawn from `site_ids`.
+
+    Args:
+        site_ids (Iterator[str]): The site ID generator.
 
     Returns:
         str: The generated site ID.
+
+    Raises:
+        ValueError: If all site IDs have been used.
     """
-    site_id = "".join(random.choices("ABCDEFGHIJKLMNOPQRSTUVWXYZ", k=2))
-    return site_id
+    try:
+        return next(site_ids)
+    except StopIteration:
+        raise ValueError("No site IDs left to assign")
 
 
-def get_anonymized_site_id(site: str, site_map: Dict[str, str]) -> str:
+def get_anonymized_site_id(
+    site: str, site_map: Dict[str, str], site_ids: Iterator[str]
+) -> str:
     """
     Get the anonymized site ID for a given site.
-    Checks the site map to ensure that the site ID is unique.
+    Site IDs are drawn from a permutation, so they are always unique.
 
     Args:
         site (str): The original site name.
         site_map (Dict[str, str]): A dictionary mapping original site names to anonymized site IDs.
+        site_ids (Iterator[str]): The site ID generator.
 
     Returns:
         str: The anonymized site ID for the given site.
@@ -67,13 +93,7 @@ def get_anonymized_site_id(site: str, site_map: Dict[str, str]) -> str:
     if site in site_map:
         return site_map[site]
 
-    site_id = generate_site_id()
-
-    # make sure it's not already in the map
-    while site_id in site_map.values():
-        site_id = generate_site_id()
-
-    return site_id
+    return generate_site_id(site_ids)
 
 
 def get_site_map(sites: Set[str]) -> Dict[str, str]:
@@ -87,9 +107,10 @@ def get_site_map(sites: Set[str]) -> Dict[str, str]:
         Dict[str, str]: A dictionary mapping original site names to anonymized site IDs.
     """
     site_map: Dict[str, str] = {}
+    site_ids = get_site_ids(random.getrandbits(32))
 
     for site in sites:
-        anonymized_site_id = get_anonymized_site_id(site, site_map)
+        anonymized_site_id = get_anonymized_site_id(site, site_map, site_ids)
         site_map[site] = anonymized_site_id
 
     return site_map
@@ -105,8 +126,8 @@ def get_all_sites(source: Path) -> Set[str]:
     Returns:
         Set[str]: A set of unique site codes.
     """
-    df = pd.read_csv(source)
-    subject_col = [c for c in df.columns if "subject" in c.lower()]
+    header = pd.read_csv(source, nrows=0).columns
+    subject_col = [c for c in header if "subject" in c.lower()]
 
     if not subject_col:
         raise KeyError(f"Subject column not found in {source}")
@@ -114,6 +135,13 @@ def get_all_sites(source: Path) -> Set[str]:
         logger.info(f"Found subject column: {subject_col}")
         subject_col = subject_col[0]
 
+    df = pd.read_csv(
+        source,
+        usecols=[subject_col],
+        dtype={subject_col: "string"},
+        engine="pyarrow",
+    )
+
     sites: Set[str] = set()
     subjects = df[subject_col].unique().tolist()
     for subject in subjects:
@@ -168,8 +196,7 @@ def generate_site_map(config_file: Path) -> None:
     mapping_dest = mappings_root / "site_mapping.json"
 
     logger.info(f"Writing site mapping to {mapping_dest}...")
-    with open(mapping_dest, "w") as f:
-        json.dump(site_map, f, indent=4)
+    utils.save_json(site_map, mapping_dest)
 
 
 if __name__ == "__main__":
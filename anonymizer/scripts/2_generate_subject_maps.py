@@ -18,9 +18,8 @@ except ValueError:
     pass
 
 import logging
-from typing import List, Dict, Set
+from typing import Iterator, List, Dict, Set
 import random
-import json
 
 from rich.logging import RichHandler
 import pandas as pd
@@ -41,20 +40,50 @@ logargs = {
 logging.basicConfig(**logargs)
 
 
-def generate_subject_id() -> str:
+def get_subject_ids(key: int) -> Iterator[str]:
     """
-    Generate a new subject ID as a random 5 digit string.
+    Generate every possible 5 digit subject ID exactly once, in a keyed random order.
+
+    Args:
+        key (int): The key selecting the order of the subject IDs.
+
+    Yields:
+        str: The next subject ID.
+    """
+    digits = "123456789"
+
+    for idx in utils.permuted_range(len(digits) ** 5, key):
+        subject_id = ""
+        for _ in range(5):
+            idx, digit = divmod(idx, len(digits))
+            subject_id += digits[digit]
+        yield subject_id
+
+
+def generate_subject_id(subject_ids: Iterator[str]) -> str:
+    """
+    Generate a new subject ID, unique among the IDs drawn from `subject_ids`.
+
+    Args:
+        subject_ids (Iterator[str]): The subject ID generator.
 
     Returns:
         str: The generated subject ID.
-    """
-    subject_id = "".join(random.choices("123456789", k=5))
 
-    return subject_id
+    Raises:
+        ValueError: If all subject IDs have been used.
+    """
+    try:
+        return next(subject_ids)
+    except StopIteration:
+        raise ValueError("No subject IDs left to assign")
 
 
 def get_anonymized_subject_id(
-    subject: str, subject_map: Dict[str, str], site_map: Dict[str, str]
+    subject: str,
+    subject_map: Dict[str, str],
+    site_map: Dict[str, str],
+    subject_ids: Dict[str, Iterator[str]],
 ) -> str:
     """
     Generates an anonymized subject ID based on the given subject, subject map, and site map.
@@ -63,6 +92,7 @@ def get_anonymized_subject_id(
         subject (str): The original subject ID.
         subject_map (Dict[str, str]): A dictionary mapping original subject IDs to anonymized subject IDs.
         site_map (Dict[str, str]): A dictionary mapping site IDs to anonymized site IDs.
+        subject_ids (Dict[str, Iterator[str]]): The subject ID generator for each anonymized site ID.
 
     Returns:
         str: The anonymized subject ID.
@@ -83,11 +113,13 @@ def get_anonymized_subject_id(
     # get site id from site map
     anonmymized_site_id = site_map[site_id]
 
-    anonmymized_subject_code = anonmymized_site_id + generate_subject_id()
+    # each anonymized site gets its own keyed permutation of subject IDs
+    if anonmymized_site_id not in subject_ids:
+        subject_ids[anonmymized_site_id] = get_subject_ids(random.getrandbits(32))
 
-    # make sure it's not already in the map
-    while anonmymized_subject_code in subject_map.values():
-        anonmymized_subject_code = anonmymized_site_id + generate_subject_id()
+    anonmymized_subject_code = anonmymized_site_id + generate_subject_id(
+        subject_ids[anonmymized_site_id]
+    )
 
     return anonmymized_subject_code
 
@@ -104,10 +136,11 @@ def get_subject_map(subjects: Set[str], site_map: Dict[str, str]) -> Dict[str, s
         Dict[str, str]: A dictionary that maps original subject IDs to anonymized subject IDs.
     """
     subject_map: Dict[str, str] = {}
+    subject_ids: Dict[str, Iterator[str]] = {}
 
     for subject in subjects:
         anonymized_subject_id = get_anonymized_subject_id(
-            subject, subject_map, site_map
+            subject, subject_map, site_map, subject_ids
         )
         subject_map[subject] = anonymized_subject_id
 
@@ -127,8 +160,8 @@ def get_all_subjects(source: Path) -> List[str]:
     Raises:
         KeyError: If the subject column is not found in the CSV file.
     """
-    df = pd.read_csv(source)
-    subject_col = [c for c in df.columns if "subject" in c.lower()]
+    header = pd.read_csv(source, nrows=0).columns
+    subject_col = [c for c in header if "subject" in c.lower()]
 
     if not subject_col:
         raise KeyError(f"Subject column not found in {source}")
@@ -136,6 +169,12 @@ def get_all_subjects(source: Path) -> List[str]:
         logger.info(f"Found subject column: {subject_col}")
         subject_col = subject_col[0]
 
+    df = pd.read_csv(
+        source,
+        usecols=[subject_col],
+        dtype={subject_col: "string"},
+        engine="pyarrow",
+    )
     subjects = df[subject_col].unique().tolist()
 
     return subjects
@@ -172,8 +211,7 @@ def add_sites_to_subject_map(
     Returns:
         Dict[str, str]: The updated subject map dictionary.
     """
-    for site_k, site_v in site_map.items():
-        subject_map[site_k] = site_v
+    subject_map.update(site_map)
 
     return subject_map
 
@@ -212,8 +250,7 @@ def generate_subject_map(config_file: Path) -> None:
 
     site_map_path = mappings_root / "site_mapping.json"
 
-    with open(site_map_path, "r") as f:
-        site_map = json.load(f)
+    site_map = utils.load_json(site_map_path)
 
     subject_map = get_subject_map(subjects, site_map)
     subject_map["AMPSCZ"] = "AMPSCZ"
@@ -227,8 +264,7 @@ def generate_subject_map(config_file: Path) -> None:
 
     mapping_dest = mappings_root / "subject_mapping.json"
     logger.info(f"Writing subject mapping to {mapping_dest}...")
-    with open(mapping_dest, "w") as f:
-        json.dump(subject_map, f, indent=4)
+    utils.save_json(subject_map, mapping_dest)
 
 
 if __name__ == "__main__":
@@ -17,7 +17,6 @@ try:
 except ValueError:
     pass
 
-import json
 import logging
 import random
 from typing import Dict
@@ -51,14 +50,20 @@ def get_subject_date_offset_map(source: Path) -> Dict[str, int]:
     Returns:
         Dict[str, int]: A dictionary mapping subjects to their corresponding date offsets.
     """
-    df = pd.read_csv(source)
-    subject_date_offset_map: Dict[str, int] = {}
+    df = pd.read_csv(
+        source,
+        usecols=["subject", "days"],
+        dtype={"subject": "string", "days": "int32"},
+        engine="pyarrow",
+    )
 
-    subjects = df["subject"].unique().tolist()
-    for subject in subjects:
-        subject_date_offset_map[subject] = df[df["subject"] == subject][
-            "days"
-        ].tolist()[0]
+    # keep the first offset found for each subject
+    subject_date_offset_map: Dict[str, int] = (
+        df.drop_duplicates("subject", keep="first")
+        .set_index("subject")["days"]
+        .astype(int)
+        .to_dict()
+    )
 
     return subject_date_offset_map
 
@@ -119,8 +124,7 @@ def generate_subject_map(config_file: Path) -> None:
 
     subject_date_map_path = mappings_root / "subject_date_mapping.json"
     logger.info(f"Writing subject date mapping to {subject_date_map_path}...")
-    with open(subject_date_map_path, "w") as f:
-        json.dump(subject_date_offset_map, f, indent=4)
+    utils.save_json(subject_date_offset_map, subject_date_map_path)
 
 
 if __name__ == "__main__":
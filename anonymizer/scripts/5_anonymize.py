@@ -17,13 +17,24 @@ try:
 except ValueError:
     pass
 
+import csv
+import functools
 import logging
+import logging.handlers
+import multiprocessing
 import os
-from typing import Dict, Set, Optional
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Set, Optional, Tuple
 import warnings
+from datetime import datetime
 
 from rich.logging import RichHandler
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 
 from anonymizer.helpers import utils
 
@@ -46,52 +57,92 @@ logging.basicConfig(**logargs)
 warnings.filterwarnings(
     "ignore", message="Discarding nonzero nanoseconds in conversion."
 )
+# Hide UserWarning from pandas:
+#  UserWarning: Could not infer format, so each element will be parsed individually.
+warnings.filterwarnings("ignore", message="Could not infer format")
 
 
 # Keep track of warnings:
-# Prevents duplicate warnings from being printed.
+# Subjects already reported as missing from the date offset map.
 WARNINGS: Set[str] = set()
 
+# template: site-subject-*.csv
+_FNAME_RE = re.compile(r"^([^-]*)-([^-]*)(?:-(.*))?$", re.DOTALL)
 
-def get_anonymized_date(
-    row: pd.Series,
-    col: str,
-    subject_date_offset_map: Dict[str, int],
-    subject_id: Optional[str] = None,
-) -> str:
-    """
-    Get the anonymized date based on the subject's date offset map.
+_MIDNIGHT = pd.Timestamp("00:00:00").time()
 
-    Args:
-        row (pd.Series): The row containing the subject's information.
-        col (str): The column name of the date.
-        subject_date_offset_map (Dict[str, int]): A dictionary mapping subject IDs to date offsets.
+# Values that are never dates on their own: plain numbers and bare times.
+NOT_DATE_PATTERN = (
+    r"[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?|\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?"
+)
 
-    Returns:
-        str: The anonymized date.
+# Values made up only of date parts: digits, separators, month and weekday names.
+DATE_PARTS_PATTERN = (
+    r"(?i)(?:[\d\s,./:+\-]|t|z|am|pm|utc|gmt|st|nd|rd|th"
+    r"|jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+    r"|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?"
+    r"|mon(?:day)?|tue(?:s(?:day)?)?|wed(?:nesday)?|thu(?:rs(?:day)?)?|fri(?:day)?"
+    r"|sat(?:urday)?|sun(?:day)?)+"
+)
 
-    Raises:
-        None
+# Compact dates, e.g. "20210101", which would otherwise pass as plain numbers.
+COMPACT_DATE_PATTERN = r"(19|20)\d{6}"
+
+# Date formats detected from the first value of a date column.
+DATE_FORMATS = ["%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%H:%M:%S"]
+
+# Same as the default `na_values` of `pd.read_csv`.
+NA_VALUES = [
+    "",
+    "#N/A",
+    "#N/A N/A",
+    "#NA",
+    "-1.#IND",
+    "-1.#QNAN",
+    "-NaN",
+    "-nan",
+    "1.#IND",
+    "1.#QNAN",
+    "<NA>",
+    "N/A",
+    "NA",
+    "NULL",
+    "NaN",
+    "None",
+    "n/a",
+    "nan",
+    "null",
+]
+
+# Keeps Arrow string columns Arrow-backed in pandas, instead of object dtype.
+ARROW_STRING_TYPES = {pa.string(): pd.StringDtype("pyarrow")}
+
+# Default number of rows read and anonymized at a time.
+CHUNK_ROWS = 200_000
+
+# Number of processed files per progress bar update.
+PROGRESS_BATCH = 64
+
+# Mappings shared with worker processes, and the caches derived from them.
+# Populated once per worker by `_init_worker`.
+WORKER_STATE: Dict[str, Any] = {}
+
+
+def get_anonymized_date(date: str, offset: int, col: str) -> str:
     """
-    if subject_id is None or len(subject_id) != 7:
-        try:
-            subject = row["subject_id"]
-        except KeyError:
-            return row[col]
-    else:
-        subject = subject_id
+    Get the anonymized date for a single value.
 
-    date = row[col]
-
-    if subject not in subject_date_offset_map:
-        warn_message = f"Subject {subject} not in date offset map"
-        if warn_message not in WARNINGS:
-            logger.warning(warn_message)
-            WARNINGS.add(warn_message)
-        return date
+    Slow path used only for values that could not be parsed by the vectorized
+    conversion in `anonymize_dates`.
 
-    offset = subject_date_offset_map[subject]
+    Args:
+        date (str): The original date.
+        offset (int): The date offset (in days) to apply.
+        col (str): The column name of the date.
 
+    Returns:
+        str: The anonymized date, or the original value if it is not a valid date.
+    """
     try:
         new_date: pd.Timestamp = pd.to_datetime(date) + pd.DateOffset(days=offset)
 
@@ -99,7 +150,7 @@ def get_anonymized_date(
         # If so, preserve the time information.
         if col == "timeofday":
             new_date = new_date.strftime("%H:%M:%S")  # type: ignore
-        elif new_date.time() != pd.Timestamp("00:00:00").time():
+        elif new_date.time() != _MIDNIGHT:
             new_date = new_date.strftime("%Y-%m-%d %H:%M:%S")  # type: ignore
         else:
             new_date = new_date.strftime("%Y-%m-%d")  # type: ignore
@@ -109,6 +160,273 @@ def get_anonymized_date(
     return str(new_date)
 
 
+def get_date_offsets(
+    df: pd.DataFrame,
+    subject_date_offset_map: pd.Series,
+    subject_id: Optional[str] = None,
+) -> Optional[pd.Series]:
+    """
+    Get the date offset (in days) for every row of the DataFrame.
+
+    Subjects missing from the date offset map get a null offset, and a warning
+    is logged once per subject.
+
+    Args:
+        df (pd.DataFrame): The DataFrame containing the subject's information.
+        subject_date_offset_map (pd.Series): A Series mapping subject IDs to date offsets.
+        subject_id (Optional[str]): The subject ID inferred from the file name.
+
+    Returns:
+        Optional[pd.Series]: The per-row date offsets, or None if the subject cannot be determined.
+    """
+    if subject_id is not None and len(subject_id) == 7:
+        subjects = pd.Series(subject_id, index=df.index)
+        codes = np.zeros(len(df), dtype="int64")
+        categories = pd.Index([subject_id])
+    elif "subject_id" in df.columns:
+        subjects = df["subject_id"]
+        categorical = subjects.astype("category")
+        codes = categorical.cat.codes.to_numpy(dtype="int64")
+        categories = categorical.cat.categories
+    else:
+        return None
+
+    # gather the offsets by position; position and code -1 both pick the
+    # trailing null slot, which also covers an empty offset map
+    offset_values = np.append(
+        subject_date_offset_map.to_numpy(dtype="int64", na_value=0), 0
+    )
+    offset_mask = np.append(subject_date_offset_map.isna().to_numpy(), True)
+    positions = np.append(subject_date_offset_map.index.get_indexer(categories), -1)[
+        codes
+    ]
+    offsets = pd.Series(
+        pd.arrays.IntegerArray(offset_values[positions], offset_mask[positions]),
+        index=df.index,
+    )
+
+    missing = offsets.isna()
+    if missing.any():
+        missing_subjects = set(subjects[missing].dropna().unique()) - WARNINGS
+        for subject in sorted(missing_subjects):
+            logger.warning(f"Subject {subject} not in date offset map")
+        WARNINGS.update(missing_subjects)
+
+    return offsets
+
+
+def _to_datetime(dates: pd.Series, **kwargs: Any) -> pd.Series:
+    """
+    Parses dates in bulk into timezone-naive datetimes, with NaT for invalid values.
+
+    Args:
+        dates (pd.Series): The dates to parse.
+        **kwargs: Extra arguments for `pd.to_datetime`.
+
+    Returns:
+        pd.Series: The parsed dates.
+    """
+    try:
+        parsed = pd.to_datetime(dates, errors="coerce", **kwargs)
+    except (ValueError, TypeError):
+        return pd.Series(pd.NaT, index=dates.index)
+
+    if isinstance(parsed.dtype, pd.DatetimeTZDtype):
+        # keep the local time, as strftime would
+        parsed = parsed.dt.tz_localize(None)
+    if not pd.api.types.is_datetime64_dtype(parsed.dtype):
+        return pd.Series(pd.NaT, index=dates.index)
+
+    return parsed
+
+
+def detect_date_format(dates: pd.Series, col: str) -> Optional[str]:
+    """
+    Detects the format of a column of dates from its first non-null value.
+
+    Args:
+        dates (pd.Series): The dates.
+        col (str): The column name of the dates.
+
+    Returns:
+        Optional[str]: The matching format from `DATE_FORMATS`, or None if none match.
+    """
+    first_idx = dates.first_valid_index()
+    if first_idx is None:
+        return None
+
+    sample = dates[first_idx]
+    for date_format in DATE_FORMATS:
+        # a bare time parses to 1900-01-01, so it only fits the time of day
+        if date_format == "%H:%M:%S" and col != "timeofday":
+            continue
+        try:
+            datetime.strptime(sample, date_format)
+        except (ValueError, TypeError):
+            continue
+        return date_format
+
+    return None
+
+
+def find_dates(values: pd.Series) -> pd.Series:
+    """
+    Finds the values of a free-form column that parse as dates.
+
+    Only values made up of date parts, with a digit, that are not plain numbers
+    or bare times, and compact dates such as "20210101", are tried. Each
+    distinct candidate is parsed once.
+
+    Args:
+        values (pd.Series): The values of the column.
+
+    Returns:
+        pd.Series: A boolean mask of the values that are dates.
+    """
+    candidates = (
+        values.str.contains(r"\d", na=False)
+        & values.str.fullmatch(DATE_PARTS_PATTERN, na=False)
+        & ~values.str.fullmatch(NOT_DATE_PATTERN, na=False)
+    ) | values.str.fullmatch(COMPACT_DATE_PATTERN, na=False)
+    if not candidates.any():
+        return candidates
+
+    codes, uniques = pd.factorize(values[candidates])
+    # only whether each value parses matters here, so timezones are normalized
+    parsed = _to_datetime(pd.Series(uniques, dtype=object), format="mixed", utc=True)
+
+    is_date = candidates.copy()
+    is_date[candidates] = parsed.notna().to_numpy()[codes]
+    return is_date
+
+
+def parse_dates(dates: pd.Series, date_format: Optional[str] = None) -> np.ndarray:
+    """
+    Parses a column of dates in bulk.
+
+    The whole column is parsed with `date_format`, or with the format inferred by
+    pandas when it is not given. Values in any other format are then parsed
+    element-wise in a second pass.
+
+    Args:
+        dates (pd.Series): The dates to parse.
+        date_format (Optional[str]): The expected format of the dates.
+
+    Returns:
+        np.ndarray: The parsed dates as datetime64[us], with NaT for values that are not dates.
+    """
+    if date_format is not None:
+        parsed = _to_datetime(dates, format=date_format)
+    else:
+        parsed = _to_datetime(dates)
+    parsed = parsed.to_numpy(dtype="datetime64[us]", copy=True)
+
+    leftovers = np.isnat(parsed) & dates.notna().to_numpy()
+    if leftovers.any():
+        reparsed = _to_datetime(dates[leftovers], format="mixed")
+        parsed[leftovers] = reparsed.to_numpy(dtype="datetime64[us]")
+
+    return parsed
+
+
+def anonymize_dates(dates: pd.Series, offsets: pd.Series, col: str) -> pd.Series:
+    """
+    Shift a column of dates by the per-row date offsets.
+
+    Each distinct (date, offset) pair is only parsed and formatted once, and the
+    results are spread back over the rows.
+
+    Args:
+        dates (pd.Series): The original dates.
+        offsets (pd.Series): The date offsets (in days) for each row.
+        col (str): The column name of the dates.
+
+    Returns:
+        pd.Series: The anonymized dates.
+    """
+    date_codes, date_values = pd.factorize(dates, use_na_sentinel=False)
+    offset_codes, offset_values = pd.factorize(offsets, use_na_sentinel=False)
+    pair_codes, pairs = pd.factorize(
+        date_codes.astype("int64") * len(offset_values) + offset_codes
+    )
+
+    # not worth the extra pass when most pairs are distinct
+    if len(pairs) * 2 > len(dates):
+        return _anonymize_dates(dates, offsets, col)
+
+    # first row of each pair
+    first = np.empty(len(pairs), dtype="int64")
+    first[pair_codes[::-1]] = np.arange(len(dates) - 1, -1, -1)
+
+    anonymized = _anonymize_dates(
+        dates.iloc[first].reset_index(drop=True),
+        offsets.iloc[first].reset_index(drop=True),
+        col,
+    )
+    return pd.Series(
+        anonymized.to_numpy()[pair_codes], index=dates.index, dtype=anonymized.dtype
+    )
+
+
+def _anonymize_dates(dates: pd.Series, offsets: pd.Series, col: str) -> pd.Series:
+    """
+    Shift a column of dates by the per-row date offsets.
+
+    Values that are missing an offset are kept as-is. Values that cannot be
+    parsed by `parse_dates` fall back to `get_anonymized_date`.
+
+    Args:
+        dates (pd.Series): The original dates.
+        offsets (pd.Series): The date offsets (in days) for each row.
+        col (str): The column name of the dates.
+
+    Returns:
+        pd.Series: The anonymized dates.
+    """
+    # shift by whole days on the underlying datetime64 array
+    date_format = detect_date_format(dates, col)
+    values = parse_dates(dates, date_format)
+    valid = ~np.isnat(values) & offsets.notna().to_numpy()
+    deltas = offsets.to_numpy(dtype="int64", na_value=0) * np.timedelta64(1, "D")
+    shifted = values + deltas
+
+    if col == "timeofday":
+        # shifting by whole days does not change the time of day
+        formatted = np.datetime_as_string(values, unit="s")
+        formatted = pd.Series(formatted, index=dates.index).str[11:]
+    else:
+        days = shifted.astype("datetime64[D]")
+        formatted = np.datetime_as_string(days)
+
+        # preserve the time information, if any
+        has_time = valid & (shifted != days)
+        if has_time.any():
+            with_time = np.char.replace(
+                np.datetime_as_string(shifted, unit="s"), "T", " "
+            )
+            formatted = np.where(has_time, with_time, formatted)
+
+        formatted = pd.Series(formatted, index=dates.index)
+
+    anonymized = formatted.where(valid, dates)
+
+    # slow path: values that could not be parsed in bulk
+    fallback = (
+        pd.Series(np.isnat(values), index=dates.index) & dates.notna() & offsets.notna()
+    )
+    if fallback.any():
+        anonymized[fallback] = pd.Series(
+            [
+                get_anonymized_date(date, offset, col)
+                for date, offset in zip(dates[fallback], offsets[fallback])
+            ],
+            index=dates.index[fallback],
+        )
+
+    return anonymized
+
+
+@functools.lru_cache(maxsize=4096)
 def get_subject_id_from_filename(file_name: str) -> Optional[str]:
     """
     Get the subject ID from the given file name.
@@ -122,26 +440,28 @@ def get_subject_id_from_filename(file_name: str) -> Optional[str]:
     Raises:
         ValueError: If the file name is invalid.
     """
-    # template: site-subject-*.csv
-    try:
-        parts = file_name.split("-")
-        subject = parts[1]
-    except IndexError:
+    match = _FNAME_RE.match(file_name)
+    if match is None:
         return None
 
-    return subject
+    return match.group(2)
 
 
 def generate_anoymized_file_name(
-    file_name: str, subject_map: Dict[str, str], site_map: Dict[str, str]
+    file_name: str,
+    subject_map: pd.Series,
+    site_map: pd.Series,
+    prefixes: Optional[Dict[Tuple[str, str], str]] = None,
 ) -> str:
     """
     Generate an anonymized file name based on the given file name, subject map, and site map.
 
     Args:
         file_name (str): The original file name.
-        subject_map (Dict[str, str]): A dictionary mapping original subject names to anonymized subject IDs.
-        site_map (Dict[str, str]): A dictionary mapping original site names to anonymized site IDs.
+        subject_map (pd.Series): A Series mapping original subject names to anonymized subject IDs.
+        site_map (pd.Series): A Series mapping original site names to anonymized site IDs.
+        prefixes (Optional[Dict[Tuple[str, str], str]]): A cache mapping (site, subject) to
+            the anonymized "site-subject" prefix. Only valid for the given maps.
 
     Returns:
         str: The anonymized file name.
@@ -149,27 +469,26 @@ def generate_anoymized_file_name(
     Raises:
         ValueError: If the file name is invalid or if the site or subject is not found in the respective maps.
     """
-    # template: site-subject-*.csv
-    try:
-        parts = file_name.split("-")
-        site = parts[0]
-        subject = parts[1]
-        others = parts[2:]
-        others = "-".join(others)
-    except IndexError:
+    match = _FNAME_RE.match(file_name)
+    if match is None:
         if file_name.endswith("metadata.csv"):
             return file_name
         raise ValueError(f"Invalid file name: {file_name}")
 
-    if site not in site_map:
-        raise ValueError(f"Invalid site: {site}")
-    if subject not in subject_map:
-        raise ValueError(f"Invalid subject: {subject}")
+    site, subject, others = match.groups(default="")
+
+    prefix = prefixes.get((site, subject)) if prefixes is not None else None
+    if prefix is None:
+        if site not in site_map:
+            raise ValueError(f"Invalid site: {site}")
+        if subject not in subject_map:
+            raise ValueError(f"Invalid subject: {subject}")
 
-    site_id = site_map[site]
-    subject_id = subject_map[subject]
+        prefix = f"{site_map[site]}-{subject_map[subject]}"
+        if prefixes is not None:
+            prefixes[(site, subject)] = prefix
 
-    anonymized_file_name = f"{site_id}-{subject_id}-{others}"
+    anonymized_file_name = f"{prefix}-{others}"
 
     # logger.debug(f"{file_name} -> {anonymized_file_name}")
 
@@ -188,15 +507,97 @@ def get_output_path(file_path: Path, data_root: Path, output_root: Path) -> Path
     Returns:
         Path: The output path for the file.
     """
-    relative_path = file_path.relative_to(data_root)
-    return output_root / relative_path
+    return _get_output_dir(file_path.parent, data_root, output_root) / file_path.name
+
+
+@functools.lru_cache(maxsize=4096)
+def _get_output_dir(directory: Path, data_root: Path, output_root: Path) -> Path:
+    """
+    Map the given directory from data root to output root.
+
+    Cached by directory, since files are processed directory by directory.
+
+    Args:
+        directory (Path): The directory, under the data root.
+        data_root (Path): The root directory of the data.
+        output_root (Path): The root directory of the output.
+
+    Returns:
+        Path: The output directory.
+    """
+    return output_root / directory.relative_to(data_root)
+
+
+@functools.lru_cache(maxsize=1024)
+def _classify_columns(
+    columns: Tuple[str, ...],
+) -> Tuple[Tuple[str, ...], Tuple[str, ...], bool]:
+    """
+    Classifies the columns of a DataFrame into date, subject and site columns.
+
+    Cached by schema, since most files in a directory share the same columns.
+
+    Args:
+        columns (Tuple[str, ...]): The column names of the DataFrame.
+
+    Returns:
+        Tuple[Tuple[str, ...], Tuple[str, ...], bool]: The date columns, the subject
+            columns, and whether the DataFrame has a site column.
+    """
+    date_cols = tuple(c for c in columns if "date" in c.lower() or c == "timeofday")
+    subject_cols = tuple(c for c in columns if "subject" in c.lower())
+    has_site = "site" in columns
+
+    return date_cols, subject_cols, has_site
+
+
+def _has_sensitive_data(columns: List[str], file_name: str) -> bool:
+    """
+    Checks whether a CSV file may hold anything to anonymize.
+
+    Any column can hold dates, so a file is only free of sensitive data when it
+    has no subject or site column and its date offset cannot be determined,
+    i.e. it has no subject column and is not named after a single subject.
+
+    Args:
+        columns (List[str]): The column names of the file.
+        file_name (str): The name of the file.
+
+    Returns:
+        bool: Whether the file has to be anonymized.
+    """
+    _, subject_cols, has_site = _classify_columns(tuple(columns))
+    if subject_cols or has_site:
+        return True
+
+    # same rule as `get_date_offsets`
+    subject_id = get_subject_id_from_filename(file_name)
+    return subject_id is not None and len(subject_id) == 7
+
+
+def remap_column(values: pd.Series, mapping: pd.Series) -> pd.Series:
+    """
+    Remap the values of a column using the given mapping.
+
+    The column is converted to a categorical first, so the mapping is looked up
+    once per distinct value rather than once per row. The remaining per-row work
+    is a take on the category codes, which already runs in compiled code.
+
+    Args:
+        values (pd.Series): The original values.
+        mapping (pd.Series): A Series mapping original values to anonymized values.
+
+    Returns:
+        pd.Series: The remapped values, with NaN for values not in the mapping.
+    """
+    return values.astype("category").map(mapping)
 
 
 def anonymize_df(
     df: pd.DataFrame,
-    subject_map: Dict[str, str],
-    site_map: Dict[str, str],
-    subject_date_offset_map: Dict[str, int],
+    subject_map: pd.Series,
+    site_map: pd.Series,
+    subject_date_offset_map: pd.Series,
     subject_id: Optional[str] = None,
 ) -> pd.DataFrame:
     """
@@ -204,94 +605,441 @@ def anonymize_df(
 
     Args:
         df (pd.DataFrame): The DataFrame to be anonymized.
-        subject_map (Dict[str, str]): A dictionary mapping original subject IDs to anonymized subject IDs.
-        site_map (Dict[str, str]): A dictionary mapping original site IDs to anonymized site IDs.
-        subject_date_offset_map (Dict[str, int]): A dictionary mapping subject IDs to date offsets for
+        subject_map (pd.Series): A Series mapping original subject IDs to anonymized subject IDs.
+        site_map (pd.Series): A Series mapping original site IDs to anonymized site IDs.
+        subject_date_offset_map (pd.Series): A Series mapping subject IDs to date offsets for
             anonymizing dates.
 
     Returns:
         pd.DataFrame: The anonymized DataFrame.
     """
+    date_cols, subject_cols, has_site = _classify_columns(tuple(df.columns))
+
+    # anonymize subject id
+    # The original IDs are still needed for the date offsets, so the remapped
+    # columns are only written back once the dates are done.
+    anonymized_subjects: Dict[str, pd.Series] = {}
+    valid_subjects = np.ones(len(df), dtype=bool)
+    # if len(subject_cols) > 1:
+    #     logger.warning(
+    #         f"Found {len(subject_cols)} subject columns: {subject_cols}"
+    #     )
+    for subject_col in subject_cols:
+        anonymized_subjects[subject_col] = remap_column(df[subject_col], subject_map)
+
+        # mark rows with invalid subject id
+        valid_subjects &= anonymized_subjects[subject_col].notna().to_numpy()
+
+    # drop rows with invalid subject id, before any other work is done on them
+    if not valid_subjects.all():
+        df = df.loc[valid_subjects].copy()
+        anonymized_subjects = {
+            col: values[valid_subjects] for col, values in anonymized_subjects.items()
+        }
+
     # anonymize date
-    # date_cols = [col for col in df.columns if "date" in col]
-
-    for col in df.columns:
-        df[col] = df.apply(
-            lambda row: get_anonymized_date(
-                row, col, subject_date_offset_map, subject_id
-            ),
-            axis=1,
+    # Columns named as dates are shifted as a whole. Any other column can still
+    # hold dates (e.g. "mtime"), so its date-like values are shifted as well.
+    other_cols = [
+        col
+        for col in df.columns
+        if col not in date_cols and col not in subject_cols and col != "site"
+    ]
+    if date_cols or other_cols:
+        offsets = get_date_offsets(df, subject_date_offset_map, subject_id)
+        if offsets is not None:
+            for col in date_cols:
+                df[col] = anonymize_dates(df[col], offsets, col)
+
+            for col in other_cols:
+                date_like = find_dates(df[col])
+                if date_like.any():
+                    anonymized = df[col].copy()
+                    anonymized[date_like] = anonymize_dates(
+                        df[col][date_like], offsets[date_like], col
+                    )
+                    df[col] = anonymized
+
+    for subject_col, values in anonymized_subjects.items():
+        df[subject_col] = values
+
+    # anonymize site id
+    # Mapped on its own rather than derived from the subject, since combined
+    # files carry site and network codes (e.g. "AMPSCZ") in the subject column.
+    if has_site:
+        df["site"] = remap_column(df["site"], site_map)
+
+    return df
+
+
+def read_csv_header(file_path: Path) -> Optional[List[str]]:
+    """
+    Reads the column names from the first line of a CSV file.
+
+    Args:
+        file_path (Path): The path to the CSV file.
+
+    Returns:
+        Optional[List[str]]: The column names, or None if the file is empty.
+
+    Raises:
+        UnicodeDecodeError: If the header is not valid UTF-8.
+    """
+    with open(file_path, newline="", encoding="utf-8-sig") as f:
+        return next(csv.reader(f), None)
+
+
+def read_csv_arrow(
+    file_path: Path, chunk_rows: int, columns: Optional[List[str]] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Reads a CSV file in chunks of about `chunk_rows` rows using the Arrow CSV reader.
+
+    Every column is read as Arrow-backed strings, with the same null values as
+    `pd.read_csv(dtype=str)`. At least one chunk is always yielded, so the
+    header of an empty file is preserved.
+
+    Args:
+        file_path (Path): The path to the CSV file.
+        chunk_rows (int): The minimum number of rows per chunk.
+        columns (Optional[List[str]]): The header of the file, if already read.
+
+    Yields:
+        pd.DataFrame: The next chunk of the file.
+
+    Raises:
+        pa.ArrowInvalid: If the file cannot be parsed, or its header is not supported.
+    """
+    if columns is None:
+        try:
+            columns = read_csv_header(file_path)
+        except UnicodeDecodeError as e:
+            raise pa.ArrowInvalid(f"Invalid header: {e}")
+
+    # pandas renames duplicate columns, Arrow does not
+    if not columns or len(set(columns)) != len(columns):
+        raise pa.ArrowInvalid(f"Unsupported header: {columns}")
+
+    convert_options = pacsv.ConvertOptions(
+        column_types={col: pa.string() for col in columns},
+        null_values=NA_VALUES,
+        strings_can_be_null=True,
+    )
+    # quoted free-text fields may span lines
+    parse_options = pacsv.ParseOptions(newlines_in_values=True)
+    reader = pacsv.open_csv(
+        str(file_path), parse_options=parse_options, convert_options=convert_options
+    )
+
+    batches: List[pa.RecordBatch] = []
+    num_rows = 0
+    yielded = False
+    for batch in reader:
+        batches.append(batch)
+        num_rows += batch.num_rows
+        if num_rows >= chunk_rows:
+            yield pa.Table.from_batches(batches).to_pandas(
+                types_mapper=ARROW_STRING_TYPES.get
+            )
+            batches, num_rows = [], 0
+            yielded = True
+
+    if batches or not yielded:
+        yield pa.Table.from_batches(batches, schema=reader.schema).to_pandas(
+            types_mapper=ARROW_STRING_TYPES.get
         )
 
-    # anonymize subject id
+
+def get_arrow_array(values: pd.Series) -> pa.Array:
+    """
+    Converts a Series of strings to an Arrow string array.
+
+    Args:
+        values (pd.Series): The Series to convert.
+
+    Returns:
+        pa.Array: The Arrow string array.
+
+    Raises:
+        pa.ArrowTypeError: If the Series holds values that are not strings.
+    """
     try:
-        subject_cols = [c for c in df.columns if "subject" in c.lower()]
+        return pa.array(values, type=pa.string(), from_pandas=True)
+    except pa.ArrowTypeError:
+        # e.g. an all-null float column
+        return pa.array(
+            values.to_numpy(dtype=object), type=pa.string(), from_pandas=True
+        )
 
-        if not subject_cols:
-            raise KeyError("Subject column not found")
-        else:
-            # if len(subject_cols) > 1:
-            #     logger.warning(
-            #         f"Found {len(subject_cols)} subject columns: {subject_cols}"
-            #     )
-            for subject_col in subject_cols:
-                df[subject_col] = df[subject_col].map(subject_map)
 
-                # drop rows with invalid subject id
-                df.dropna(subset=[subject_col], inplace=True)
+def get_arrow_table(df: pd.DataFrame) -> pa.Table:
+    """
+    Converts a DataFrame of strings to an Arrow table with string columns.
+
+    Arrow-backed string columns, as read by `read_csv_arrow`, are converted
+    without copying. Other columns go through an object array.
 
-    except KeyError:
-        pass
+    Args:
+        df (pd.DataFrame): The DataFrame to convert.
 
-    # anonymize site id
+    Returns:
+        pa.Table: The Arrow table.
+
+    Raises:
+        pa.ArrowTypeError: If a column holds values that are not strings.
+    """
+    arrays = [get_arrow_array(df.iloc[:, idx]) for idx in range(df.shape[1])]
+    schema = pa.schema([(str(col), pa.string()) for col in df.columns])
+
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def write_csv_arrow(chunks: Iterable[pd.DataFrame], output_path: Path) -> None:
+    """
+    Writes DataFrame chunks to a single CSV file using the Arrow CSV writer.
+
+    Args:
+        chunks (Iterable[pd.DataFrame]): The DataFrame chunks to write.
+        output_path (Path): The path to the output CSV file.
+
+    Returns:
+        None
+
+    Raises:
+        pa.ArrowTypeError: If a column holds values that are not strings.
+    """
+    writer: Optional[pacsv.CSVWriter] = None
     try:
-        df["site"] = df["site"].map(site_map)
-    except KeyError:
-        pass
+        for chunk in chunks:
+            table = get_arrow_table(chunk)
+            if writer is None:
+                writer = pacsv.CSVWriter(str(output_path), table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
 
-    return df
+
+def write_anonymized_csv(
+    file_path: Path,
+    output_path: Path,
+    columns: Optional[List[str]],
+    subject_map: pd.Series,
+    site_map: pd.Series,
+    subject_date_offset_map: pd.Series,
+    chunk_rows: int = CHUNK_ROWS,
+) -> None:
+    """
+    Streams a CSV file through `anonymize_df` into the given output path.
+
+    Uses the Arrow CSV reader and writer, and falls back to pandas for files
+    that Arrow cannot handle.
+
+    Args:
+        file_path (Path): The path to the input CSV file.
+        output_path (Path): The path to write the anonymized CSV file to.
+        columns (Optional[List[str]]): The header of the input file, if already read.
+        subject_map (pd.Series): A Series mapping original subject IDs to anonymized subject IDs.
+        site_map (pd.Series): A Series mapping original site IDs to anonymized site IDs.
+        subject_date_offset_map (pd.Series): A Series mapping original subject IDs to date offsets.
+        chunk_rows (int): The number of rows to read and anonymize at a time.
+
+    Returns:
+        None
+    """
+    subject_id = get_subject_id_from_filename(file_path.name)
+    try:
+        anonymized_chunks = (
+            anonymize_df(
+                chunk, subject_map, site_map, subject_date_offset_map, subject_id
+            )
+            for chunk in read_csv_arrow(file_path, chunk_rows, columns)
+        )
+        write_csv_arrow(anonymized_chunks, output_path)
+        return
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        logger.warning(f"Falling back to pandas CSV reader for {file_path}: {e}")
+
+    # slow path: read and write the file with pandas
+    with pd.read_csv(file_path, dtype=str, chunksize=chunk_rows) as chunks, open(
+        output_path, "w", newline=""
+    ) as f:
+        for idx, chunk in enumerate(chunks):
+            chunk = anonymize_df(
+                chunk, subject_map, site_map, subject_date_offset_map, subject_id
+            )
+            chunk.to_csv(f, index=False, header=idx == 0)
 
 
 def anonymize_csv(
     file_path: Path,
-    subject_map: Dict[str, str],
-    site_map: Dict[str, str],
-    subject_date_offset_map: Dict[str, int],
+    subject_map: pd.Series,
+    site_map: pd.Series,
+    subject_date_offset_map: pd.Series,
     data_root: Path,
     output_root: Path,
+    chunk_rows: int = CHUNK_ROWS,
+    force: bool = False,
+    maps_mtime: float = 0.0,
+    prefixes: Optional[Dict[Tuple[str, str], str]] = None,
 ) -> None:
     """
     Anonymizes a CSV file by applying subject, site, and date offset mappings.
 
+    The file is streamed in chunks of `chunk_rows` rows, so memory usage does not
+    grow with the size of the file. Files whose output is newer than both the
+    input and the mappings are skipped, unless `force` is set, and files with
+    nothing to anonymize are copied as-is.
+
+    The output is written to a temporary file next to it and moved into place
+    once complete, so an interrupted run never leaves a truncated output behind.
+
     Args:
         file_path (Path): The path to the input CSV file.
-        subject_map (Dict[str, str]): A dictionary mapping original subject IDs to anonymized subject IDs.
-        site_map (Dict[str, str]): A dictionary mapping original site IDs to anonymized site IDs.
-        subject_date_offset_map (Dict[str, int]): A dictionary mapping original subject IDs to date offsets.
+        subject_map (pd.Series): A Series mapping original subject IDs to anonymized subject IDs.
+        site_map (pd.Series): A Series mapping original site IDs to anonymized site IDs.
+        subject_date_offset_map (pd.Series): A Series mapping original subject IDs to date offsets.
         data_root (Path): The root directory of the input data.
         output_root (Path): The root directory for the output data.
+        chunk_rows (int): The number of rows to read and anonymize at a time.
+        force (bool): Whether to rewrite outputs that are already up to date.
+        maps_mtime (float): The latest modification time of the mapping files.
+        prefixes (Optional[Dict[Tuple[str, str], str]]): A cache of anonymized file name
+            prefixes for the given maps.
 
     Returns:
         None
     """
-    df = pd.read_csv(file_path, dtype=str)
-    subject_id = get_subject_id_from_filename(file_path.name)
-    df = anonymize_df(df, subject_map, site_map, subject_date_offset_map, subject_id)
-
     output_path = get_output_path(file_path, data_root, output_root)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
 
     output_name = output_path.name
     try:
         anonymized_name = generate_anoymized_file_name(
-            output_name, subject_map, site_map
+            output_name, subject_map, site_map, prefixes
         )
     except ValueError as e:
         logger.warning(f"Ignoring file: {file_path}: {e}")
         return
 
     output_path = output_path.parent / anonymized_name
-    df.to_csv(output_path, index=False)
+    if (
+        not force
+        and output_path.exists()
+        and output_path.stat().st_mtime >= max(file_path.stat().st_mtime, maps_mtime)
+    ):
+        return
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    try:
+        columns = read_csv_header(file_path)
+    except UnicodeDecodeError:
+        columns = None
+
+    temp_path = output_path.with_name(f".{output_path.name}.{os.getpid()}.tmp")
+    try:
+        # files with nothing to anonymize only need to be renamed
+        if columns and not _has_sensitive_data(columns, file_path.name):
+            shutil.copyfile(file_path, temp_path)
+        else:
+            write_anonymized_csv(
+                file_path,
+                temp_path,
+                columns,
+                subject_map,
+                site_map,
+                subject_date_offset_map,
+                chunk_rows,
+            )
+        os.replace(temp_path, output_path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+
+def _init_worker(
+    subject_map: pd.Series,
+    site_map: pd.Series,
+    subject_date_offset_map: pd.Series,
+    data_root: Path,
+    output_root: Path,
+    chunk_rows: int,
+    force: bool,
+    maps_mtime: float,
+    log_queue: "multiprocessing.Queue[logging.LogRecord]",
+) -> None:
+    """
+    Initializes a worker process with the mappings used to anonymize CSV files.
+
+    Log records of the worker are sent to the parent process through `log_queue`,
+    which handles them with its own handlers.
+
+    Args:
+        subject_map (pd.Series): A Series mapping original subject IDs to anonymized subject IDs.
+        site_map (pd.Series): A Series mapping original site IDs to anonymized site IDs.
+        subject_date_offset_map (pd.Series): A Series mapping original subject IDs to date offsets.
+        data_root (Path): The root directory of the input data.
+        output_root (Path): The root directory for the output data.
+        chunk_rows (int): The number of rows to read and anonymize at a time.
+        force (bool): Whether to rewrite outputs that are already up to date.
+        maps_mtime (float): The latest modification time of the mapping files.
+        log_queue (multiprocessing.Queue): The queue to send log records to.
+
+    Returns:
+        None
+    """
+    logging.getLogger().handlers = [logging.handlers.QueueHandler(log_queue)]
+
+    WORKER_STATE["subject_map"] = subject_map
+    WORKER_STATE["site_map"] = site_map
+    WORKER_STATE["subject_date_offset_map"] = subject_date_offset_map
+    WORKER_STATE["data_root"] = data_root
+    WORKER_STATE["output_root"] = output_root
+    WORKER_STATE["chunk_rows"] = chunk_rows
+    WORKER_STATE["force"] = force
+    WORKER_STATE["maps_mtime"] = maps_mtime
+    # file name prefixes are cached next to the maps they are derived from
+    WORKER_STATE["prefixes"] = {}
+
+
+def anonymize_csv_path(file_path: Path) -> None:
+    """
+    Anonymizes a CSV file using the mappings stored by `_init_worker`.
+
+    Args:
+        file_path (Path): The path to the input CSV file.
+
+    Returns:
+        None
+    """
+    anonymize_csv(file_path, **WORKER_STATE)
+
+
+def iter_csvs(root: Path) -> Iterator[Path]:
+    """
+    Recursively yields the CSV files under the given directory.
+
+    Uses `os.scandir`, so the cached directory entry type is reused instead of
+    issuing a `stat` call per file. Symlinked directories are not followed, and
+    directories that cannot be read are skipped with a warning.
+
+    Args:
+        root (Path): The directory to search.
+
+    Yields:
+        Path: The path to each CSV file.
+    """
+    try:
+        entries = os.scandir(root)
+    except OSError as e:
+        logger.warning(f"Skipping directory: {root}: {e}")
+        return
+
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from iter_csvs(Path(entry.path))
+            elif entry.name.endswith(".csv") and entry.is_file():
+                yield Path(entry.path)
 
 
 def anonymize_data(config_file: Path) -> None:
@@ -305,37 +1053,81 @@ def anonymize_data(config_file: Path) -> None:
         None
     """
     config_params = utils.config(config_file, "general")
+    try:
+        anonymize_config = utils.config(config_file, "anonymize")
+    except Exception:
+        # the [anonymize] section is optional, fall back to the defaults
+        anonymize_config = {}
 
     mappings_root = Path(config_params["mappings_root"])
     data_root = Path(config_params["data_root"])
     output_root = Path(config_params["output_root"])
+    chunk_rows = int(anonymize_config.get("chunk_rows", CHUNK_ROWS))
+    force = anonymize_config.get("force", "False").strip().lower() == "true"
+    max_workers = int(anonymize_config.get("max_workers", 0)) or os.cpu_count()
 
     subject_map_file = mappings_root / "subject_mapping.json"
     site_map_file = mappings_root / "site_mapping.json"
     subject_date_offset_map_file = mappings_root / "subject_date_mapping.json"
 
-    subject_map = utils.load_json(subject_map_file)
-    site_map = utils.load_json(site_map_file)
-    subject_date_offset_map = utils.load_json(subject_date_offset_map_file)
+    # Series lookups are hashed in C, instead of a dict lookup per row.
+    # Arrow-backed values keep the remapped columns out of Python objects.
+    subject_map = pd.Series(utils.load_json(subject_map_file), dtype="string[pyarrow]")
+    site_map = pd.Series(utils.load_json(site_map_file), dtype="string[pyarrow]")
+    subject_date_offset_map = pd.Series(
+        utils.load_json(subject_date_offset_map_file), dtype="Int32"
+    )
 
-    with utils.get_progress_bar() as progress:
-        for root, dirs, files in os.walk(data_root):
-            task = progress.add_task(f"Processing {root}...", total=len(files))
+    # outputs older than any of the mappings are stale
+    maps_mtime = max(
+        map_file.stat().st_mtime
+        for map_file in (subject_map_file, site_map_file, subject_date_offset_map_file)
+    )
+
+    # sorted, so files of the same directory are batched to the same worker
+    csv_paths = sorted(iter_csvs(data_root))
 
-            for file in files:
-                progress.update(task, advance=1)
-                if not file.endswith(".csv"):
-                    continue
+    # Workers are spawned rather than forked, so they do not inherit the live
+    # progress display or the console lock. Their log records are sent back and
+    # handled here, by the handlers of this process.
+    mp_context = multiprocessing.get_context("spawn")
+    log_queue = mp_context.Queue()
+    log_listener = logging.handlers.QueueListener(
+        log_queue, *logging.getLogger().handlers, respect_handler_level=True
+    )
+    log_listener.start()
 
-                file_path = Path(root) / file
-                anonymize_csv(
-                    file_path,
+    try:
+        with utils.get_progress_bar() as progress:
+            task = progress.add_task(f"Processing {data_root}...", total=len(csv_paths))
+
+            # the maps are parsed once here, and pickled to each worker once by
+            # the initializer
+            with ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=mp_context,
+                initializer=_init_worker,
+                initargs=(
                     subject_map,
                     site_map,
                     subject_date_offset_map,
                     data_root,
                     output_root,
-                )
+                    chunk_rows,
+                    force,
+                    maps_mtime,
+                    log_queue,
+                ),
+            ) as executor:
+                # batch files per task to cut inter-process overhead on large trees
+                results = executor.map(anonymize_csv_path, csv_paths, chunksize=16)
+                for idx, _ in enumerate(results, start=1):
+                    if idx % PROGRESS_BATCH == 0:
+                        progress.update(task, advance=PROGRESS_BATCH)
+
+                progress.update(task, completed=len(csv_paths))
+    finally:
+        log_listener.stop()
 
 
 if __name__ == "__main__":